@@ -0,0 +1,24 @@
+# Compare extracting a manifest of series one by one against Batch.run, with a few transient failures injected
+# Usage: python benchmark_batch_extraction.py [series] [rows_per_series] [failures] [latency_seconds]
+import sys
+import time
+from benchmark_stubs import EIAStubServer
+from naturalgas_extraction import EIA, Batch
+
+def main(series: int = 24, rows_per_series: int = 2000, failures: int = 3, latency: float = 0.25) -> None:
+    manifest = [{'name': 'spot-%02d' % number, 'endpoint': 'natural-gas/pri/fut/data/', 'parameters': {'frequency': 'daily', 'data[0]': 'value', 'facets[series][]': 'SERIES%02d' % number}} for number in range(series)]
+    with EIAStubServer(total_rows=rows_per_series, latency=latency) as stub:
+        EIA.base_url, EIA.requests_per_second = stub.url, 0
+        Batch.backoff = 0.1
+        EIA.disconnect()
+        start = time.perf_counter()
+        rows = sum(len(EIA.extract_all(series['endpoint'], series['parameters'])) for series in manifest)
+        print('one-by-one rows=%d requests=%d time=%.3fs' % (rows, stub.request_count, time.perf_counter() - start))
+        stub.request_count, stub.failures = 0, failures
+        results = Batch.run(manifest)
+        print('batch      rows=%d requests=%d time=%.3fs' % (results['summary']['rows'], stub.request_count, results['summary']['seconds']))
+        print(Batch.report(results))
+        EIA.disconnect()
+
+if __name__ == '__main__':
+    main(*(cast(arg) for cast, arg in zip((int, int, int, float), sys.argv[1:])))
@@ -0,0 +1,39 @@
+# Compare retrieving keys one at a time with S3.retrieve against S3.retrieve_many, and a single GET against ranged GETs
+# The serial loop is timed on at most serial_sample keys and scaled up for larger key counts
+# Usage: python benchmark_bulk_retrieval.py [latency_seconds] [large_object_megabytes] [serial_sample]
+import json
+import os
+import sys
+import time
+from benchmark_stubs import S3StubServer, synthetic_row
+from naturalgas_extraction import S3
+
+def main(latency: float = 0.02, large_object_megabytes: int = 64, serial_sample: int = 1000) -> None:
+    body = json.dumps([synthetic_row(index) for index in range(20)]).encode('utf-8')
+    with S3StubServer(latency=latency) as stub:
+        S3.endpoint_url, S3.bucket = stub.url, 'benchmark'
+        S3.access_key_id, S3.secret_access_key = 'test', 'test'
+        with S3():
+            for keys in (10, 100, 1000, 10000):
+                stub.objects = {'benchmark/keys-%d/%05d.json' % (keys, index): body for index in range(keys)}
+                sample = min(keys, serial_sample)
+                start = time.perf_counter()
+                serial = [next(S3.retrieve('keys-%d/' % keys, '%05d.json' % index)) for index in range(sample)]
+                serial_time = (time.perf_counter() - start) * keys / sample
+                start = time.perf_counter()
+                bulk = S3.retrieve_many('keys-%d/' % keys)
+                bulk_time = time.perf_counter() - start
+                assert list(bulk.values())[:sample] == serial
+                print('keys=%-6d serial=%7.3fs%s bulk=%7.3fs speedup=%5.1fx' % (keys, serial_time, ' (est)' if sample < keys else '      ', bulk_time, serial_time / bulk_time))
+
+            stub.objects = {'benchmark/large/object.bin': os.urandom(large_object_megabytes * 2**20)}
+            start = time.perf_counter()
+            S3.connect().get_object(Bucket=S3.bucket, Key='large/object.bin')['Body'].read()
+            single_time = time.perf_counter() - start
+            start = time.perf_counter()
+            S3.download_many(S3.list_objects('large/'))
+            ranged_time = time.perf_counter() - start
+            print('large %dMB single GET=%.3fs ranged GETs=%.3fs' % (large_object_megabytes, single_time, ranged_time))
+
+if __name__ == '__main__':
+    main(*(cast(arg) for cast, arg in zip((float, int, int), sys.argv[1:])))
@@ -0,0 +1,33 @@
+# Compare cold and warm extraction and retrieval times with the local cache enabled
+# Usage: python benchmark_cache.py [total_rows] [latency_seconds]
+import sys
+import tempfile
+import time
+from benchmark_stubs import EIAStubServer, S3StubServer
+from naturalgas_extraction import EIA, S3, Cache
+
+def timed(label: str, run) -> None:
+    Cache.reset_stats()
+    start = time.perf_counter()
+    run()
+    print('%-16s time=%.3fs %s' % (label, time.perf_counter() - start, Cache.stats()))
+
+def main(total_rows: int = 100000, latency: float = 0.05) -> None:
+    parameters = {'frequency': 'daily', 'data[0]': 'value'}
+    with tempfile.TemporaryDirectory() as directory, EIAStubServer(total_rows=total_rows, latency=latency) as eia, S3StubServer(latency=latency) as stub:
+        Cache.directory = directory
+        EIA.base_url, EIA.requests_per_second = eia.url, 0
+        S3.endpoint_url, S3.bucket = stub.url, 'benchmark'
+        S3.access_key_id, S3.secret_access_key = 'test', 'test'
+        EIA.disconnect()
+        for label in ('extract cold', 'extract warm'):
+            timed(label, lambda: EIA.extract_all('natural-gas/pri/fut/data/', parameters))
+        with S3():
+            S3.store(EIA.extract_all('natural-gas/pri/fut/data/', parameters), 'benchmark/', 'prices.json')
+            for label in ('retrieve cold', 'retrieve warm'):
+                timed(label, lambda: next(S3.retrieve('benchmark/', 'prices.json')))
+        EIA.disconnect()
+        Cache.directory = None
+
+if __name__ == '__main__':
+    main(*(cast(arg) for cast, arg in zip((int, float), sys.argv[1:])))
@@ -0,0 +1,38 @@
+# Compare the single JSON document against partitioned Parquet: object size, upload time and time to load one series
+# Usage: python benchmark_columnar_storage.py [series] [rows_per_series]
+import sys
+import time
+from benchmark_stubs import S3StubServer, synthetic_row
+from naturalgas_extraction import S3
+
+def main(series: int = 10, rows_per_series: int = 10000) -> None:
+    names = ['SERIES%02d' % number for number in range(series)]
+    rows = [synthetic_row(index, series=name) for name in names for index in range(rows_per_series)]
+    target = names[series // 2]
+    with S3StubServer() as stub:
+        S3.endpoint_url, S3.bucket = stub.url, 'benchmark'
+        S3.access_key_id, S3.secret_access_key = 'test', 'test'
+        with S3():
+            start = time.perf_counter()
+            S3.store(rows, 'json/', 'prices.json')
+            json_upload = time.perf_counter() - start
+            start = time.perf_counter()
+            json_series = [row for row in next(S3.retrieve('json/', 'prices.json')) if row['series'] == target]
+            json_load = time.perf_counter() - start
+            json_size = sum(len(body) for key, body in stub.objects.items() if key.startswith('benchmark/json/'))
+
+            start = time.perf_counter()
+            keys = S3.store_columnar(rows, 'parquet/', 'prices')
+            parquet_upload = time.perf_counter() - start
+            start = time.perf_counter()
+            parquet_series = S3.retrieve_columnar('parquet/', 'prices', facet=target, columns=['period', 'value'])
+            parquet_load = time.perf_counter() - start
+            parquet_size = sum(len(body) for key, body in stub.objects.items() if key.startswith('benchmark/parquet/'))
+
+    assert len(json_series) == parquet_series.num_rows == rows_per_series
+    print('rows=%d series=%d parquet partitions=%d' % (len(rows), series, len(keys)))
+    print('json     size=%8.2fMB upload=%.3fs load-one-series=%.3fs' % (json_size / 2**20, json_upload, json_load))
+    print('parquet  size=%8.2fMB upload=%.3fs load-one-series=%.3fs' % (parquet_size / 2**20, parquet_upload, parquet_load))
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
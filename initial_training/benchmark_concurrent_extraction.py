@@ -0,0 +1,23 @@
+# Compare sequential and concurrent EIA.extract_all against a local stub server
+# Usage: python benchmark_concurrent_extraction.py [total_rows] [latency_seconds]
+import sys
+import time
+from benchmark_stubs import EIAStubServer, synthetic_row
+from naturalgas_extraction import EIA
+
+def main(total_rows: int = 100000, latency: float = 0.05) -> None:
+    with EIAStubServer(total_rows=total_rows, latency=latency) as stub:
+        EIA.base_url = stub.url
+        EIA.requests_per_second = 0
+        EIA.disconnect()
+        parameters = {'frequency': 'daily', 'data[0]': 'value'}
+        for concurrent in (False, True):
+            start = time.perf_counter()
+            data = EIA.extract_all(endpoint='natural-gas/pri/fut/data/', parameters=parameters, concurrent=concurrent)
+            elapsed = time.perf_counter() - start
+            assert len(data) == total_rows and data[-1] == synthetic_row(total_rows - 1)
+            print('%-10s rows=%d pages=%d workers=%d time=%.3fs' % ('concurrent' if concurrent else 'sequential', len(data), -(-total_rows // EIA.page_length), EIA.max_workers if concurrent else 1, elapsed))
+        EIA.disconnect()
+
+if __name__ == '__main__':
+    main(*(cast(arg) for cast, arg in zip((int, float), sys.argv[1:])))
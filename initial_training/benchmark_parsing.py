@@ -0,0 +1,39 @@
+# Compare decoding pages into lists of dicts against parsing them into typed NumPy columns, from decoded rows
+# and straight from the response body: rows/s and bytes per row
+# Usage: python benchmark_parsing.py [pages]
+import json
+import sys
+import time
+import tracemalloc
+import naturalgas_extraction
+from benchmark_stubs import synthetic_row
+from naturalgas_extraction import EIA, concat_columns, parse_body, parse_columns
+
+# Decode every page body and keep the result, reporting throughput and retained memory per row
+def measure(label: str, bodies: list, decode) -> None:
+    rows = EIA.page_length * len(bodies)
+    start = time.perf_counter()
+    for body in bodies:
+        decode(body)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    retained = [decode(body) for body in bodies]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del retained
+    print('%-22s rows/s=%10.0f bytes/row=%6.1f' % (label, rows / elapsed, size / rows))
+
+def main(pages: int = 40) -> None:
+    bodies = [json.dumps({'response': {'total': str(pages * EIA.page_length), 'data': [synthetic_row(page * EIA.page_length + index) for index in range(EIA.page_length)]}}).encode('utf-8') for page in range(pages)]
+    decoders = [('json', json.loads)]
+    if naturalgas_extraction.loads is not json.loads:
+        decoders.append(('orjson', naturalgas_extraction.loads))
+    for name, loads in decoders:
+        measure('%s list-of-dicts' % name, bodies, lambda body: loads(body)['response']['data'])
+        measure('%s columns' % name, bodies, lambda body: parse_columns(loads(body)['response']['data']))
+    measure('arrow body columns', bodies, lambda body: parse_body(body)[0])
+    parsed = concat_columns([parse_body(body)[0] for body in bodies])
+    print('columns nbytes/row=%.1f' % (sum(column.nbytes for column in parsed['columns'].values()) / parsed['rows']))
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
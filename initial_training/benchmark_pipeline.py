@@ -0,0 +1,92 @@
+# Offline pipeline benchmark: replay recorded EIA pages from a local fixture server into a local S3 stub
+# and report per-stage metrics, optionally failing when throughput regresses against a saved baseline
+#
+# Record real pages once (needs API_KEY):
+#   python benchmark_pipeline.py --record natural-gas/pri/fut/data/ --parameter frequency=daily --parameter data[0]=value --fixtures fixtures/
+# Replay them (or synthetic pages when --fixtures is omitted) and save or compare a baseline:
+#   python benchmark_pipeline.py --fixtures fixtures/ --output baseline.json
+#   python benchmark_pipeline.py --fixtures fixtures/ --baseline baseline.json
+import argparse
+import json
+import os
+import sys
+import tempfile
+from benchmark_stubs import EIAFixtureServer, S3StubServer, write_synthetic_fixtures
+from naturalgas_extraction import EIA, S3, Metrics
+
+# Save every page of a real extraction in the fixture layout served by EIAFixtureServer
+def record_fixtures(endpoint: str, parameters: dict, directory: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+    offset, total = 0, None
+    while total is None or offset < total:
+        response = EIA.api_request(endpoint=endpoint, parameters=parameters, offset=offset)
+        with open(os.path.join(directory, 'page-%d.json' % offset), 'wb') as fixture:
+            fixture.write(response.content)
+        total = int(response.json()['response']['total'])
+        offset += int(parameters.get('length', EIA.page_length))
+
+# Run every instrumented stage once against the local servers
+def run_pipeline(directory: str, latency: float) -> dict:
+    parameters = {'frequency': 'daily', 'data[0]': 'value'}
+    with EIAFixtureServer(directory, latency=latency) as eia, S3StubServer(latency=latency) as stub:
+        EIA.base_url, EIA.requests_per_second = eia.url, 0
+        S3.endpoint_url, S3.bucket = stub.url, 'benchmark'
+        S3.access_key_id, S3.secret_access_key = 'test', 'test'
+        EIA.disconnect()
+        Metrics.reset()
+        with S3():
+            data = EIA.extract_all('fixtures/', parameters, concurrent=True)
+            S3.store(data, 'pipeline/', 'prices.json')
+            S3.store_stream(EIA.iter_pages('fixtures/', parameters, concurrent=True), 'pipeline/', 'prices.ndjson')
+            S3.store_columnar(data, 'pipeline/', 'prices')
+            next(S3.retrieve('pipeline/', 'prices.json'))
+            S3.retrieve_columnar('pipeline/', 'prices')
+        EIA.disconnect()
+    return Metrics.snapshot()
+
+# Stages whose rows/s or bytes/s fell more than the tolerance below the baseline
+def regressions(snapshot: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for stage, expected in baseline['stages'].items():
+        current = snapshot['stages'].get(stage)
+        for field in ('rows_per_second', 'bytes_per_second'):
+            if current is not None and expected[field] > 0 and current[field] < expected[field] * (1 - tolerance):
+                found.append('%s %s %.0f -> %.0f (%.0f%%)' % (stage, field, expected[field], current[field], 100 * (current[field] / expected[field] - 1)))
+    return found
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--fixtures', help='directory of recorded page-<offset>.json files (synthetic pages when omitted)')
+    parser.add_argument('--record', metavar='ENDPOINT', help='record the pages of a real extraction into --fixtures and exit')
+    parser.add_argument('--parameter', action='append', default=[], metavar='NAME=VALUE', help='request parameter used with --record')
+    parser.add_argument('--rows', type=int, default=50000, help='rows per synthetic series')
+    parser.add_argument('--latency', type=float, default=0.02, help='artificial latency of each local request in seconds')
+    parser.add_argument('--format', choices=('json', 'prometheus'), default='json')
+    parser.add_argument('--output', help='also write the JSON metrics to this file, e.g. to keep as a baseline')
+    parser.add_argument('--baseline', help='JSON metrics of an earlier run to check for throughput regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed fractional throughput drop before failing')
+    arguments = parser.parse_args()
+
+    if arguments.record:
+        if not arguments.fixtures:
+            parser.error('--record needs --fixtures')
+        record_fixtures(arguments.record, dict(parameter.split('=', 1) for parameter in arguments.parameter), arguments.fixtures)
+        return 0
+    with tempfile.TemporaryDirectory() as directory:
+        if arguments.fixtures is None:
+            write_synthetic_fixtures(directory, arguments.rows)
+        snapshot = run_pipeline(arguments.fixtures or directory, arguments.latency)
+    print(Metrics.to_prometheus() if arguments.format == 'prometheus' else json.dumps(snapshot, indent=2, sort_keys=True))
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(snapshot, output, indent=2, sort_keys=True)
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline:
+            found = regressions(snapshot, json.load(baseline), arguments.tolerance)
+        for regression in found:
+            print('regression: %s' % regression, file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+# Compare a client per call against the shared pooled S3 client on a local S3 stand-in
+# Usage: python benchmark_s3_client.py [objects] [threads]
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+import naturalgas_extraction
+from benchmark_stubs import S3StubServer, synthetic_row
+from naturalgas_extraction import S3
+
+# Count every boto3 client construction made by the extraction module
+class CountingBoto3:
+    def __init__(self):
+        self.clients = 0
+
+    def client(self, *args, **kwargs):
+        self.clients += 1
+        return boto3.client(*args, **kwargs)
+
+def main(objects: int = 200, threads: int = 8) -> None:
+    counter = CountingBoto3()
+    naturalgas_extraction.boto3 = counter
+    payload = [synthetic_row(index) for index in range(10)]
+    with S3StubServer() as stub:
+        S3.endpoint_url, S3.bucket = stub.url, 'benchmark'
+        S3.access_key_id, S3.secret_access_key = 'test', 'test'
+
+        # Previous behaviour: build and drop a client around every operation
+        def store_per_call(index: int) -> None:
+            S3.store(payload, 'per-call/', '%d.json' % index)
+            S3.disconnect()
+
+        def store_pooled(index: int) -> None:
+            S3.store(payload, 'pooled/', '%d.json' % index)
+
+        for label, store, workers in (('per-call', store_per_call, 1), ('pooled', store_pooled, 1), ('pooled', store_pooled, threads)):
+            S3.disconnect()
+            counter.clients = 0
+            start = time.perf_counter()
+            with S3(), ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(store, range(objects)))
+            elapsed = time.perf_counter() - start
+            print('%-8s threads=%d objects=%d clients=%d total=%.3fs per-object=%.2fms' % (label, workers, objects, counter.clients, elapsed, 1000 * elapsed / objects))
+    naturalgas_extraction.boto3 = boto3
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
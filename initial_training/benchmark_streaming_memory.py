@@ -0,0 +1,41 @@
+# Compare peak traced memory of the list + json.dumps store path against the streaming NDJSON upload
+# Usage: python benchmark_streaming_memory.py [streaming_rows] [list_rows]
+import sys
+import time
+import tracemalloc
+from benchmark_stubs import S3StubServer, synthetic_row
+from naturalgas_extraction import EIA, S3
+
+# Serve synthetic pages in-process so only the extraction and storage paths are measured
+def synthetic_fetch_page(total_rows: int):
+    def fetch_page(cls, endpoint: str, parameters: dict, offset=0, use_cache=True) -> tuple:
+        length = int(parameters.get('length', cls.page_length))
+        return [synthetic_row(index) for index in range(offset, min(offset + length, total_rows))], total_rows
+    return classmethod(fetch_page)
+
+# Run a storage path under tracemalloc and report its peak
+def measure(label: str, total_rows: int, stub: S3StubServer, run) -> None:
+    EIA.fetch_page = synthetic_fetch_page(total_rows)
+    stub.bytes_received = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('%-9s rows=%-8d uploaded=%7.1fMB peak=%7.1fMB time=%.1fs' % (label, total_rows, stub.bytes_received / 2**20, peak / 2**20, elapsed))
+
+def main(streaming_rows: int = 2000000, list_rows: int = 200000) -> None:
+    fetch_page = EIA.fetch_page
+    parameters = {'frequency': 'daily', 'data[0]': 'value'}
+    with S3StubServer(discard=True) as stub:
+        S3.endpoint_url, S3.bucket = stub.url, 'benchmark'
+        S3.access_key_id, S3.secret_access_key = 'test', 'test'
+        with S3():
+            measure('list', list_rows, stub, lambda: S3.store(EIA.extract_all('natural-gas/pri/fut/data/', parameters), 'benchmark/', 'list.json'))
+            for total_rows in (list_rows, streaming_rows):
+                measure('streaming', total_rows, stub, lambda: S3.store_stream(EIA.iter_pages('natural-gas/pri/fut/data/', parameters), 'benchmark/', 'stream.ndjson'))
+    EIA.fetch_page = fetch_page
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,241 @@
+# Import modules
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+# Threaded HTTP server on a free loopback port, started and stopped as a context manager
+class LocalServer:
+    def __init__(self, handler):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> str:
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+# Build a synthetic EIA row for the given row number
+def synthetic_row(index: int, series: str = 'RNGWHHD') -> dict:
+    period = date(1997, 1, 7) + timedelta(days=index)
+    return {
+        'period': period.isoformat(),
+        'duoarea': 'RGC',
+        'area-name': 'NA',
+        'product': 'EPG0',
+        'product-name': 'Natural Gas',
+        'process': 'PS0',
+        'process-name': 'Spot Price',
+        'series': series,
+        'series-description': 'Henry Hub Natural Gas Spot Price (Dollars per Million Btu)',
+        'value': '%.2f' % (2 + (index % 700) / 100),
+        'units': '$/MMBTU',
+    }
+
+# Local HTTP server replaying EIA v2 style paged responses with an artificial round trip latency
+# Each requested facets[series][] value gets total_rows rows; the first `failures` requests answer 503
+class EIAStubServer(LocalServer):
+    def __init__(self, total_rows: int, latency: float = 0.05, failures: int = 0):
+        self.total_rows = total_rows
+        self.latency = latency
+        self.failures = failures
+        self.request_count = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.request_count += 1
+                query = parse_qs(urlparse(self.path).query)
+                offset = int(query.get('offset', ['0'])[0])
+                length = int(query.get('length', ['5000'])[0])
+                series = query.get('facets[series][]', ['RNGWHHD'])
+                first = max((date.fromisoformat(query['start'][0]) - date(1997, 1, 7)).days, 0) if 'start' in query else 0
+                per_series = max(stub.total_rows - first, 0)
+                rows = [synthetic_row(first + index % per_series, series[index // per_series]) for index in range(offset, min(offset + length, per_series * len(series)))]
+                status = 200
+                if stub.failures > 0:
+                    stub.failures -= 1
+                    status = 503
+                body = json.dumps({'response': {'total': str(per_series * len(series)), 'data': rows}}).encode('utf-8')
+                time.sleep(stub.latency)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        LocalServer.__init__(self, Handler)
+
+    # Base url to point EIA.base_url at
+    @property
+    def url(self) -> str:
+        return self.address + '/v2/'
+
+# Local HTTP server replaying recorded EIA pages from a directory of page-<offset>.json files
+class EIAFixtureServer(LocalServer):
+    def __init__(self, directory: str, latency: float = 0.05):
+        self.directory = directory
+        self.latency = latency
+        self.request_count = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.request_count += 1
+                offset = int(parse_qs(urlparse(self.path).query).get('offset', ['0'])[0])
+                path = os.path.join(stub.directory, 'page-%d.json' % offset)
+                status, body = (200, open(path, 'rb').read()) if os.path.exists(path) else (404, b'{}')
+                time.sleep(stub.latency)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        LocalServer.__init__(self, Handler)
+
+    # Base url to point EIA.base_url at
+    @property
+    def url(self) -> str:
+        return self.address + '/v2/'
+
+# Write synthetic pages in the recorded fixture layout, for running the harness without recordings
+def write_synthetic_fixtures(directory: str, total_rows: int, page_length: int = 5000, series: int = 4) -> None:
+    os.makedirs(directory, exist_ok=True)
+    total = total_rows * series
+    for offset in range(0, total, page_length):
+        rows = [synthetic_row(index % total_rows, 'SERIES%02d' % (index // total_rows)) for index in range(offset, min(offset + page_length, total))]
+        with open(os.path.join(directory, 'page-%d.json' % offset), 'w') as fixture:
+            json.dump({'response': {'total': str(total), 'data': rows}}, fixture)
+
+# Multipart ETag: md5 of the concatenated part digests followed by the part count
+def multipart_etag(parts: dict) -> str:
+    digests = b''.join(hashlib.md5(parts[number]).digest() for number in sorted(parts))
+    return '%s-%d' % (hashlib.md5(digests).hexdigest(), len(parts))
+
+# Local path-style S3 stand-in keeping objects in memory, with an artificial per-request latency
+# With discard=True object bodies are dropped after counting so the stub does not skew memory benchmarks
+class S3StubServer(LocalServer):
+    def __init__(self, latency: float = 0.0, discard: bool = False):
+        self.latency = latency
+        self.discard = discard
+        self.objects = {}
+        self.uploads = {}
+        self.request_count = 0
+        self.bytes_received = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def object_key(self) -> str:
+                return unquote(urlparse(self.path).path.lstrip('/'))
+
+            def reply(self, status: int, body: bytes = b'', headers: dict = None):
+                time.sleep(stub.latency)
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def read_body(self) -> bytes:
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.bytes_received += len(body)
+                return b'' if stub.discard else body
+
+            def do_PUT(self):
+                stub.request_count += 1
+                query = parse_qs(urlparse(self.path).query)
+                body = self.read_body()
+                if 'uploadId' in query:
+                    stub.uploads[query['uploadId'][0]][int(query['partNumber'][0])] = body
+                else:
+                    stub.objects[self.object_key()] = body
+                self.reply(200, headers={'ETag': '"%s"' % hashlib.md5(body).hexdigest()})
+
+            # Create and complete multipart uploads
+            def do_POST(self):
+                stub.request_count += 1
+                query = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if 'uploads' in query:
+                    upload_id = '%d' % len(stub.uploads)
+                    stub.uploads[upload_id] = {}
+                    body = '<InitiateMultipartUploadResult><Key>%s</Key><UploadId>%s</UploadId></InitiateMultipartUploadResult>' % (self.object_key(), upload_id)
+                else:
+                    parts = stub.uploads.pop(query['uploadId'][0])
+                    stub.objects[self.object_key()] = b''.join(parts[number] for number in sorted(parts))
+                    body = '<CompleteMultipartUploadResult><Key>%s</Key><ETag>"%s"</ETag></CompleteMultipartUploadResult>' % (self.object_key(), multipart_etag(parts))
+                self.reply(200, body.encode('utf-8'), {'Content-Type': 'application/xml'})
+
+            # ListObjectsV2 on a bucket, without pagination
+            def list_objects(self, bucket: str, prefix: str):
+                contents = ''.join('<Contents><Key>%s</Key><ETag>&quot;%s&quot;</ETag><Size>%d</Size></Contents>' % (escape(key[len(bucket) + 1:]), hashlib.md5(body).hexdigest(), len(body)) for key, body in sorted(stub.objects.items()) if key.startswith(bucket + '/' + prefix))
+                body = '<ListBucketResult><Name>%s</Name><Prefix>%s</Prefix><IsTruncated>false</IsTruncated>%s</ListBucketResult>' % (bucket, escape(prefix), contents)
+                self.reply(200, body.encode('utf-8'), {'Content-Type': 'application/xml'})
+
+            def do_GET(self):
+                stub.request_count += 1
+                query = parse_qs(urlparse(self.path).query)
+                if 'list-type' in query:
+                    self.list_objects(self.object_key().rstrip('/'), query.get('prefix', [''])[0])
+                    return
+                body = stub.objects.get(self.object_key())
+                if body is None:
+                    self.reply(404, b'<Error><Code>NoSuchKey</Code></Error>', {'Content-Type': 'application/xml'})
+                    return
+                headers = {'ETag': '"%s"' % hashlib.md5(body).hexdigest(), 'Content-Type': 'application/octet-stream'}
+                if 'Range' in self.headers:
+                    first, _, last = self.headers['Range'].split('=', 1)[1].partition('-')
+                    last = min(int(last) if last else len(body) - 1, len(body) - 1)
+                    headers['Content-Range'] = 'bytes %s-%d/%d' % (first, last, len(body))
+                    self.reply(206, body[int(first):last + 1], headers)
+                    return
+                self.reply(200, body, headers)
+
+            def do_HEAD(self):
+                stub.request_count += 1
+                body = stub.objects.get(self.object_key())
+                if body is None:
+                    self.reply(404)
+                    return
+                self.reply(200, body, {'ETag': '"%s"' % hashlib.md5(body).hexdigest()})
+
+            def log_message(self, format, *args):
+                pass
+
+        LocalServer.__init__(self, Handler)
+
+    # Endpoint url to point S3.endpoint_url at
+    @property
+    def url(self) -> str:
+        return self.address
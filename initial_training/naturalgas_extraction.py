@@ -1,85 +1,1066 @@
 # Import modules
+import hashlib
+import heapq
+import io
 import json
+import math
 import os
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import product
+from datetime import date
+from urllib.parse import urlparse
 import requests
 import boto3
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from s3transfer.manager import TransferManager
+from s3transfer.subscribers import BaseSubscriber
 from dotenv import load_dotenv
 
+# Use orjson for decoding responses when it is installed
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
 # Import environment variables
 load_dotenv()
 
+# Per-stage timings, bytes, rows and counters for a pipeline run, exported as JSON or Prometheus text
+class Metrics:
+    # Define class variables
+    stages = {}
+    counters = {}
+    lock = threading.Lock()
+
+    # Time a stage; the yielded sample's 'bytes' and 'rows' can be filled in by the caller
+    @classmethod
+    @contextmanager
+    def timer(cls, stage: str):
+        sample = {'bytes': 0, 'rows': 0}
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield sample
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            cls.record(stage, time.perf_counter() - start, sample['bytes'], sample['rows'], failed)
+
+    @classmethod
+    def record(cls, stage: str, seconds: float, transferred=0, rows=0, failed=False) -> None:
+        with cls.lock:
+            totals = cls.stages.setdefault(stage, {'calls': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'bytes': 0, 'rows': 0})
+            totals['calls'] += 1
+            totals['errors'] += failed
+            totals['seconds'] += seconds
+            totals['max_seconds'] = max(totals['max_seconds'], seconds)
+            totals['bytes'] += transferred
+            totals['rows'] += rows
+
+    @classmethod
+    def increment(cls, counter: str, amount=1) -> None:
+        with cls.lock:
+            cls.counters[counter] = cls.counters.get(counter, 0) + amount
+
+    # Stage totals with derived rows/s and bytes/s, plus counters and cache statistics
+    @classmethod
+    def snapshot(cls) -> dict:
+        with cls.lock:
+            stages = {stage: dict(totals) for stage, totals in cls.stages.items()}
+            counters = dict(cls.counters)
+        for totals in stages.values():
+            totals['rows_per_second'] = totals['rows'] / totals['seconds'] if totals['seconds'] else 0.0
+            totals['bytes_per_second'] = totals['bytes'] / totals['seconds'] if totals['seconds'] else 0.0
+        counters.update({'cache_%s' % name: value for name, value in Cache.stats().items()})
+        return {'stages': stages, 'counters': counters}
+
+    @classmethod
+    def to_json(cls) -> str:
+        return json.dumps(cls.snapshot(), indent=2, sort_keys=True)
+
+    # Prometheus text exposition format
+    @classmethod
+    def to_prometheus(cls, prefix='extraction') -> str:
+        snapshot = cls.snapshot()
+        lines = []
+        for field, kind in (('calls', 'counter'), ('errors', 'counter'), ('seconds', 'counter'), ('max_seconds', 'gauge'), ('bytes', 'counter'), ('rows', 'counter')):
+            name = '%s_stage_%s%s' % (prefix, field, '_total' if kind == 'counter' else '')
+            lines.append('# TYPE %s %s' % (name, kind))
+            lines.extend('%s{stage="%s"} %s' % (name, stage, totals[field]) for stage, totals in sorted(snapshot['stages'].items()))
+        for counter, value in sorted(snapshot['counters'].items()):
+            lines.append('# TYPE %s_%s_total counter' % (prefix, counter))
+            lines.append('%s_%s_total %s' % (prefix, counter, value))
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls.lock:
+            cls.stages = {}
+            cls.counters = {}
+        Cache.reset_stats()
+
+# On-disk cache of EIA pages and S3 objects, stored zlib-compressed under the hash of what identifies them
+# Entries expire after ttl seconds and the least recently used are evicted once the cache exceeds max_bytes
+# Sizes and access order are tracked in memory, seeded by one scan of the directory; the directory is only
+# walked again when the total goes over max_bytes, and eviction then trims it to evict_ratio of max_bytes
+# Disabled unless EXTRACTION_CACHE_DIR is set
+class Cache:
+    # Define class variables
+    directory = os.environ.get('EXTRACTION_CACHE_DIR')
+    ttl = float(os.environ.get('EXTRACTION_CACHE_TTL', 24 * 60 * 60))
+    max_bytes = int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+    evict_ratio = 0.9
+    hits = 0
+    misses = 0
+    entries = None
+    entries_directory = None
+    total_bytes = 0
+    lock = threading.Lock()
+
+    # Hash the parts identifying a payload into a cache key
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def path(cls, key: str) -> str:
+        return os.path.join(cls.directory, key[:2], key)
+
+    # Scan the directory into {path: size} ordered from least to most recently used; call with the lock held
+    @classmethod
+    def scan(cls) -> None:
+        found = []
+        for root, _, files in os.walk(cls.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_atime, stat.st_size, path))
+        cls.entries = OrderedDict((path, size) for _, size, path in sorted(found))
+        cls.entries_directory = cls.directory
+        cls.total_bytes = sum(cls.entries.values())
+
+    # The in-memory index, seeded on first use or when the directory changes; call with the lock held
+    @classmethod
+    def index(cls) -> OrderedDict:
+        if cls.entries is None or cls.entries_directory != cls.directory:
+            cls.scan()
+        return cls.entries
+
+    # Drop an entry from the index; call with the lock held
+    @classmethod
+    def forget(cls, path: str) -> None:
+        cls.total_bytes -= cls.index().pop(path, 0)
+
+    # Return a cached payload, or None when it is missing or older than the ttl
+    @classmethod
+    def get(cls, key: str):
+        if cls.directory is None:
+            return None
+        path = cls.path(key)
+        try:
+            modified = os.stat(path).st_mtime
+            if time.time() - modified > cls.ttl:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'rb') as cache_file:
+                payload = zlib.decompress(cache_file.read())
+            # Record the access time for LRU eviction while keeping the modification time the ttl is measured from
+            os.utime(path, (time.time(), modified))
+        except FileNotFoundError:
+            with cls.lock:
+                cls.forget(path)
+                cls.misses += 1
+            return None
+        with cls.lock:
+            entries = cls.index()
+            if path in entries:
+                entries.move_to_end(path)
+            cls.hits += 1
+        return payload
+
+    # Store a payload atomically; with evict=False the caller runs evict once after a batch of puts
+    @classmethod
+    def put(cls, key: str, payload: bytes, evict=True) -> None:
+        if cls.directory is None:
+            return
+        path = cls.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        compressed = zlib.compress(payload, 1)
+        with open(temporary_path, 'wb') as cache_file:
+            cache_file.write(compressed)
+        os.replace(temporary_path, path)
+        with cls.lock:
+            cls.forget(path)
+            cls.index()[path] = len(compressed)
+            cls.total_bytes += len(compressed)
+        if evict:
+            cls.evict()
+
+    # Once over max_bytes, rescan the directory (other processes may share it) and remove least recently used entries
+    @classmethod
+    def evict(cls) -> None:
+        if cls.directory is None:
+            return
+        with cls.lock:
+            cls.index()
+            if cls.total_bytes <= cls.max_bytes:
+                return
+            cls.scan()
+            while cls.entries and cls.total_bytes > cls.max_bytes * cls.evict_ratio:
+                path, size = cls.entries.popitem(last=False)
+                cls.total_bytes -= size
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    # Hit and miss counters since the last reset
+    @classmethod
+    def stats(cls) -> dict:
+        with cls.lock:
+            return {'hits': cls.hits, 'misses': cls.misses}
+
+    @classmethod
+    def reset_stats(cls) -> None:
+        with cls.lock:
+            cls.hits = 0
+            cls.misses = 0
+
 # S3 Bucket Class for storage + retrieval of extracted content
+# A single thread-safe client is shared by every caller; use `with S3():` to close it once the last user exits
 class S3:
     # Define class variables
     access_key_id = os.environ.get('AWS_ACCESS_KEY_ID')
     secret_access_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
     bucket = os.environ.get('S3_BUCKET')
+    endpoint_url = os.environ.get('S3_ENDPOINT_URL')
+    max_pool_connections = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 10))
+    multipart_chunksize = int(os.environ.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+    multipart_concurrency = int(os.environ.get('S3_MULTIPART_CONCURRENCY', 4))
+    s3_client = None
+    client_lock = threading.Lock()
+    client_users = 0
 
-    # Connect to instance of S3 bucket
+    # Connect to instance of S3 bucket, reusing the existing client and its connection pool
     @classmethod
-    def connect(cls) -> None:
-        cls.s3_client=boto3.client('s3', aws_access_key_id=cls.access_key_id, aws_secret_access_key=cls.secret_access_key)
+    def connect(cls):
+        if cls.s3_client is None:
+            with cls.client_lock:
+                if cls.s3_client is None:
+                    config = Config(max_pool_connections=cls.max_pool_connections)
+                    cls.s3_client = boto3.client('s3', aws_access_key_id=cls.access_key_id, aws_secret_access_key=cls.secret_access_key, endpoint_url=cls.endpoint_url, config=config)
+        return cls.s3_client
 
     # Disconnect from instance of S3 bucket
     @classmethod
     def disconnect(cls) -> None:
-        del cls.s3_client
-    
+        with cls.client_lock:
+            if cls.s3_client is not None:
+                cls.s3_client.close()
+            cls.s3_client = None
+
+    def __enter__(self):
+        with self.client_lock:
+            S3.client_users += 1
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.client_lock:
+            S3.client_users -= 1
+            last_user = S3.client_users == 0
+        if last_user:
+            self.disconnect()
+
+    # Read an object's bytes, served from the local cache while its ETag is unchanged
+    @classmethod
+    def read(cls, key: str) -> bytes:
+        client = cls.connect()
+        if Cache.directory is None:
+            return client.get_object(Bucket=cls.bucket, Key=key)['Body'].read()
+        try:
+            etag = client.head_object(Bucket=cls.bucket, Key=key)['ETag']
+        except ClientError as error:
+            if error.response['Error']['Code'] != '404':
+                raise
+            # Let get_object raise the usual NoSuchKey error
+            return client.get_object(Bucket=cls.bucket, Key=key)['Body'].read()
+        cache_key = Cache.key('s3', cls.bucket, key, etag)
+        contents = Cache.get(cache_key)
+        if contents is None:
+            contents = client.get_object(Bucket=cls.bucket, Key=key, IfMatch=etag)['Body'].read()
+            Cache.put(cache_key, contents)
+        return contents
+
     # Extract data from specified object
     @classmethod
     def retrieve(cls, folder: str, object_key: str) -> dict:
-        cls.connect()
-        object = cls.s3_client.get_object(Bucket=cls.bucket, Key=folder + object_key)
-        contents = object['Body'].read().decode('utf-8')
-        yield json.loads(contents)
-        cls.disconnect()
+        with Metrics.timer('s3_retrieve') as sample:
+            contents = cls.read(folder + object_key)
+            sample['bytes'] = len(contents)
+        with Metrics.timer('s3_decode') as sample:
+            data = loads(contents)
+            sample['bytes'] = len(contents)
+            sample['rows'] = len(data) if isinstance(data, list) else 1
+        yield data
 
     # Store data into S3 bucket
     @classmethod
     def store(cls, data: list, folder: str, object_key: str) -> None:
-        data_json = json.dumps(data)
-        cls.connect()
-        cls.s3_client.put_object(Bucket=cls.bucket, Key=folder + object_key, Body=data_json, ContentType='application/json')
-        cls.disconnect()
+        with Metrics.timer('serialize') as sample:
+            data_json = json.dumps(data).encode('utf-8')
+            sample['bytes'] = len(data_json)
+            sample['rows'] = len(data) if isinstance(data, list) else 1
+        with Metrics.timer('s3_store') as sample:
+            cls.connect().put_object(Bucket=cls.bucket, Key=folder + object_key, Body=data_json, ContentType='application/json')
+            sample['bytes'] = len(data_json)
+
+    # Extract rows one at a time from a newline-delimited JSON object
+    @classmethod
+    def retrieve_stream(cls, folder: str, object_key: str):
+        object = cls.connect().get_object(Bucket=cls.bucket, Key=folder + object_key)
+        for line in object['Body'].iter_lines():
+            if line:
+                yield loads(line)
+
+    # Stream pages of rows into S3 as newline-delimited JSON through a multipart upload
+    # Only a few upload parts are held in memory at once, whatever the total number of rows
+    @classmethod
+    def store_stream(cls, pages, folder: str, object_key: str) -> int:
+        stream = NDJSONStream(pages)
+        config = TransferConfig(multipart_threshold=cls.multipart_chunksize, multipart_chunksize=cls.multipart_chunksize, max_concurrency=cls.multipart_concurrency)
+        config.max_in_memory_upload_chunks = cls.multipart_concurrency
+        with Metrics.timer('s3_store_stream') as sample:
+            cls.connect().upload_fileobj(stream, cls.bucket, folder + object_key, ExtraArgs={'ContentType': 'application/x-ndjson'}, Config=config)
+            sample['bytes'] = stream.size
+            sample['rows'] = stream.rows
+        return stream.rows
+
+    # Key of the yearly partition holding a dataset's rows for the given year
+    @staticmethod
+    def partition_key(object_key: str, year: str) -> str:
+        return '%s/year=%s.json' % (object_key, year)
+
+    # Merge rows into a dataset stored as one JSON partition per year, rewriting only the years that received rows
+    # Rows sharing every field except the data columns are treated as the same observation and the newer one wins
+    @classmethod
+    def merge_partitions(cls, rows: list, folder: str, object_key: str, data_columns=('value',)) -> list:
+        years = {}
+        for row in rows:
+            years.setdefault(row['period'][:4], []).append(row)
+        written = []
+        for year, new_rows in sorted(years.items()):
+            key = cls.partition_key(object_key, year)
+            try:
+                existing = next(cls.retrieve(folder, key))
+            except cls.connect().exceptions.NoSuchKey:
+                existing = []
+            merged = {}
+            for row in existing + new_rows:
+                merged[tuple(sorted((name, value) for name, value in row.items() if name not in data_columns))] = row
+            cls.store(sorted(merged.values(), key=lambda row: row['period']), folder, key)
+            written.append(key)
+        return written
+
+    # Store rows as zstd-compressed Parquet files partitioned by a facet and by year
+    # (<dataset>/<facet>=<value>/year=<year>.parquet) with typed period/value columns and dictionary-encoded facets
+    # Rows whose facet is missing or null share the 'all' partition
+    @classmethod
+    def store_columnar(cls, rows: list, folder: str, dataset: str, partition_by='series', data_columns=('value',)) -> list:
+        partitions = {}
+        for row in rows:
+            facet = row.get(partition_by)
+            partitions.setdefault((facet if facet is not None else 'all', row['period'][:4]), []).append(row)
+        client = cls.connect()
+
+        # Encode and upload one partition; partitions are uploaded concurrently over the shared client
+        def upload(partition) -> tuple:
+            (facet, year), partition_rows = partition
+            buffer = io.BytesIO()
+            pq.write_table(rows_to_table(partition_rows, data_columns), buffer, compression='zstd')
+            key = '%s/%s=%s/year=%s.parquet' % (dataset, partition_by, facet, year)
+            client.put_object(Bucket=cls.bucket, Key=folder + key, Body=buffer.getvalue(), ContentType='application/vnd.apache.parquet')
+            return key, buffer.tell()
+
+        with Metrics.timer('s3_store_columnar') as sample, ThreadPoolExecutor(max_workers=cls.max_pool_connections) as executor:
+            uploaded = list(executor.map(upload, sorted(partitions.items())))
+            sample['bytes'] = sum(size for _, size in uploaded)
+            sample['rows'] = len(rows)
+        return [key for key, _ in uploaded]
+
+    # Load only the requested partitions and columns of a columnar dataset into one Arrow table
+    @classmethod
+    def retrieve_columnar(cls, folder: str, dataset: str, partition_by='series', facet=None, years=None, columns=None) -> pa.Table:
+        prefix = folder + dataset + '/' + ('%s=%s/' % (partition_by, facet) if facet is not None else '')
+        years = None if years is None else {str(year) for year in years}
+        entries = [entry for entry in cls.list_objects(prefix) if years is None or entry['Key'].rsplit('year=', 1)[-1].split('.')[0] in years]
+        tables = [pq.read_table(pa.BufferReader(body), columns=columns) for body in cls.download_many(entries).values()]
+        return pa.concat_tables(tables) if tables else pa.table({})
+
+    # List the key, size and ETag of every object under a prefix
+    @classmethod
+    def list_objects(cls, prefix: str) -> list:
+        entries = []
+        for listing in cls.connect().get_paginator('list_objects_v2').paginate(Bucket=cls.bucket, Prefix=prefix):
+            entries.extend({'Key': entry['Key'], 'Size': entry['Size'], 'ETag': entry['ETag']} for entry in listing.get('Contents', []))
+        return entries
+
+    # Download listed objects concurrently into buffers preallocated from their listed sizes
+    # Small objects are streamed on a thread pool sharing the client; objects above the multipart chunk size are
+    # fetched by s3transfer as parallel ranged GETs. Both share the client's max_pool_connections, split between
+    # them when both kinds are present. Objects in the local cache are not downloaded; new ones are cached with a
+    # single eviction pass at the end
+    @classmethod
+    def download_many(cls, entries: list) -> dict:
+        client = cls.connect()
+        contents = {}
+        downloads = []
+        for entry in entries:
+            cache_key = Cache.key('s3', cls.bucket, entry['Key'], entry['ETag'])
+            cached = Cache.get(cache_key) if Cache.directory is not None else None
+            if cached is not None:
+                contents[entry['Key']] = cached
+            else:
+                downloads.append((entry, cache_key, BufferWriter(entry['Size'])))
+
+        def download(item) -> None:
+            entry, _, writer = item
+            for chunk in client.get_object(Bucket=cls.bucket, Key=entry['Key'])['Body'].iter_chunks(1024 * 1024):
+                writer.write(chunk)
+
+        large = [item for item in downloads if item[0]['Size'] > cls.multipart_chunksize]
+        small = [item for item in downloads if item[0]['Size'] <= cls.multipart_chunksize]
+        transfer_connections = max(1, cls.max_pool_connections // 2) if small else cls.max_pool_connections
+        worker_connections = max(1, cls.max_pool_connections - transfer_connections) if large else cls.max_pool_connections
+        config = TransferConfig(multipart_threshold=cls.multipart_chunksize, multipart_chunksize=cls.multipart_chunksize, max_concurrency=transfer_connections)
+        with Metrics.timer('s3_download') as sample, TransferManager(client, config) as manager, ThreadPoolExecutor(max_workers=worker_connections) as executor:
+            futures = [manager.download(cls.bucket, entry['Key'], writer, subscribers=[TransferSize(entry['Size'])]) for entry, _, writer in large]
+            futures.extend(executor.submit(download, item) for item in small)
+            for future in futures:
+                future.result()
+            sample['bytes'] = sum(entry['Size'] for entry, _, _ in downloads)
+        for entry, cache_key, writer in downloads:
+            contents[entry['Key']] = writer.getbuffer()
+            Cache.put(cache_key, contents[entry['Key']], evict=False)
+        Cache.evict()
+        return {entry['Key']: contents[entry['Key']] for entry in entries}
+
+    # Extract and decode every JSON object under a folder prefix, keyed by object key relative to the folder
+    @classmethod
+    def retrieve_many(cls, folder: str, prefix='') -> dict:
+        contents = cls.download_many(cls.list_objects(folder + prefix))
+        return {key[len(folder):]: loads(body) for key, body in contents.items()}
+
+# Convert an EIA period ('2024', '2024-05', '2024-05-17' or '2024-Q2') to the first date it covers
+def period_to_date(period: str) -> date:
+    year, _, rest = period.partition('-')
+    if rest.startswith('Q'):
+        return date(int(year), 3 * int(rest[1]) - 2, 1)
+    parts = [int(part) for part in rest.split('-')] if rest else []
+    return date(int(year), *(parts + [1, 1])[:2])
+
+# Parse periods into datetime64[D], vectorized for year, month and day periods with a per-row fallback for quarters
+def parse_periods(periods) -> np.ndarray:
+    periods = np.asarray(periods, dtype=str)
+    try:
+        return periods.astype('datetime64[D]')
+    except ValueError:
+        return np.array([period_to_date(period) for period in periods], dtype='datetime64[D]')
+
+# Smallest unsigned integer type able to index the given number of labels
+def code_type(labels: int) -> np.dtype:
+    return np.min_scalar_type(max(labels - 1, 0))
+
+# Cast a data column to float64 with missing values as NaN; when the fast cast fails, placeholder strings
+# such as 'NA' or '--' are nulled out with a vectorized pattern match first
+NUMBER_PATTERN = r'^\s*[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?\s*$'
+
+def parse_values(values: pa.Array) -> np.ndarray:
+    try:
+        return pc.cast(values, pa.float64()).to_numpy(zero_copy_only=False)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        values = pc.cast(values, pa.string())
+        numeric = pc.match_substring_regex(values, NUMBER_PATTERN)
+        return pc.cast(pc.if_else(numeric, values, pa.scalar(None, pa.string())), pa.float64()).to_numpy(zero_copy_only=False)
+
+# Convert Arrow columns of EIA rows into compact typed NumPy columns: datetime64[D] periods, float64 data columns
+# (missing or unparseable values as NaN) and dictionary-encoded category columns stored as the smallest unsigned
+# integer codes into their labels, with nulls kept as a None label. With categories=None every other column is dictionary-encoded
+def arrays_to_columns(arrays: dict, rows: int, data_columns=('value',), categories=None) -> dict:
+    columns = {}
+    labels = {}
+    for name, values in arrays.items():
+        if name == 'period':
+            if pa.types.is_timestamp(values.type) or pa.types.is_date(values.type):
+                columns[name] = pc.cast(values, pa.date32()).to_numpy(zero_copy_only=False).astype('datetime64[D]')
+            else:
+                columns[name] = parse_periods(values.to_numpy(zero_copy_only=False))
+        elif name in data_columns:
+            columns[name] = parse_values(values)
+        elif categories is None or name in categories:
+            encoded = pc.cast(values, pa.string()).dictionary_encode(null_encoding='encode')
+            labels[name] = encoded.dictionary.to_numpy(zero_copy_only=False).astype(object)
+            columns[name] = encoded.indices.to_numpy(zero_copy_only=False).astype(code_type(len(labels[name])))
+    return {'rows': rows, 'columns': columns, 'categories': labels}
+
+# Parse decoded EIA rows into typed columns (see arrays_to_columns)
+# Columns are the union of the rows' keys, with None where a row lacks one, matching Arrow's JSON reader
+# A column mixing value types, such as numbers and strings, is read as text
+def parse_columns(rows: list, data_columns=('value',), categories=None) -> dict:
+    arrays = {}
+    for name in dict.fromkeys(name for row in rows for name in row):
+        values = [row.get(name) for row in rows]
+        try:
+            arrays[name] = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays[name] = pa.array([None if value is None else str(value) for value in values], type=pa.string())
+    return arrays_to_columns(arrays, len(rows), data_columns, categories)
+
+# Parse a raw EIA response body straight into typed columns with Arrow's JSON reader, without building Python dicts
+# Returns the parsed page and the total row count; bodies Arrow cannot read fall back to decoding and parse_columns
+def parse_body(body: bytes, data_columns=('value',), categories=None) -> tuple:
+    try:
+        table = pa_json.read_json(pa.BufferReader(body), read_options=pa_json.ReadOptions(block_size=len(body) + 1))
+        response = table.column('response').combine_chunks()
+        total = int(response.field('total')[0].as_py())
+        data = response.field('data')
+        if len(data.values) == 0:
+            return parse_columns([], data_columns, categories), total
+        rows = data.values
+        return arrays_to_columns({field.name: rows.field(index) for index, field in enumerate(rows.type)}, len(rows), data_columns, categories), total
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, KeyError):
+        response = loads(body)['response']
+        return parse_columns(response['data'], data_columns, categories), int(response['total'])
+
+# Concatenate parsed pages, remapping each page's category codes onto the combined labels
+# Columns are the union over all pages; a page lacking one is filled with NaT periods, NaN data values or the null label
+def concat_columns(pages: list) -> dict:
+    pages = [page for page in pages if page['rows']]
+    if not pages:
+        return {'rows': 0, 'columns': {}, 'categories': {}}
+    columns = {}
+    labels = {}
+    for name in dict.fromkeys(name for page in pages for name in page['columns']):
+        if any(name in page['categories'] for page in pages):
+            mapping = {}
+            codes = []
+            for page in pages:
+                if name in page['columns']:
+                    remap = np.array([mapping.setdefault(label, len(mapping)) for label in page['categories'][name]], dtype=np.int64)
+                    codes.append(remap[page['columns'][name]])
+                else:
+                    codes.append(np.full(page['rows'], mapping.setdefault(None, len(mapping)), dtype=np.int64))
+            labels[name] = np.array(list(mapping), dtype=object)
+            columns[name] = np.concatenate(codes).astype(code_type(len(mapping)))
+        else:
+            missing = np.datetime64('NaT', 'D') if name == 'period' else np.nan
+            dtype = 'datetime64[D]' if name == 'period' else np.float64
+            columns[name] = np.concatenate([page['columns'][name] if name in page['columns'] else np.full(page['rows'], missing, dtype=dtype) for page in pages])
+    return {'rows': sum(page['rows'] for page in pages), 'columns': columns, 'categories': labels}
+
+# Build a typed Arrow table from EIA rows: date32 periods, float64 data columns and dictionary-encoded text columns
+# Null categories stay null in the table rather than becoming an empty label
+def rows_to_table(rows: list, data_columns=('value',)) -> pa.Table:
+    parsed = parse_columns(rows, data_columns)
+    columns = {}
+    for name, values in parsed['columns'].items():
+        if name in parsed['categories']:
+            labels = parsed['categories'][name]
+            present = np.array([label is not None for label in labels], dtype=bool)
+            indices = pa.array((np.cumsum(present) - 1)[values].astype(np.int32), mask=~present[values])
+            columns[name] = pa.DictionaryArray.from_arrays(indices, pa.array(labels[present], type=pa.string()))
+        elif name in data_columns:
+            columns[name] = pa.array(values, mask=np.isnan(values))
+        else:
+            columns[name] = pa.array(values)
+    return pa.table(columns)
+
+# Last period extracted for each endpoint + facet combination into each destination dataset, kept in a local state file or in S3
+class Watermarks:
+    # Define class variables
+    state_file = os.environ.get('EIA_STATE_FILE', 'eia_watermarks.json')
+    s3_folder = os.environ.get('EIA_STATE_S3_FOLDER')
+    object_key = 'watermarks.json'
+    ignored_parameters = ('api_key', 'offset', 'length', 'start', 'end')
+    lock = threading.Lock()
+
+    # Identify a series by its destination dataset, its endpoint and the parameters that select it (frequency, facets, data columns)
+    @classmethod
+    def key(cls, endpoint: str, parameters: dict, destination: str) -> str:
+        selection = {name: value for name, value in parameters.items() if name not in cls.ignored_parameters and not name.startswith('sort')}
+        return destination + ' <- ' + endpoint.strip('/') + '?' + json.dumps(selection, sort_keys=True)
+
+    # Load every watermark from the configured backend
+    @classmethod
+    def load(cls) -> dict:
+        if cls.s3_folder is not None:
+            try:
+                return next(S3.retrieve(cls.s3_folder, cls.object_key))
+            except S3.connect().exceptions.NoSuchKey:
+                return {}
+        if not os.path.exists(cls.state_file):
+            return {}
+        with open(cls.state_file) as state_file:
+            return json.load(state_file)
+
+    # Return the last period seen for a series, or None before its first extraction
+    @classmethod
+    def get(cls, endpoint: str, parameters: dict, destination: str):
+        return cls.load().get(cls.key(endpoint, parameters, destination))
+
+    # Record the last period seen for a series
+    @classmethod
+    def set(cls, endpoint: str, parameters: dict, destination: str, period: str) -> None:
+        with cls.lock:
+            watermarks = cls.load()
+            watermarks[cls.key(endpoint, parameters, destination)] = period
+            if cls.s3_folder is not None:
+                S3.store(watermarks, cls.s3_folder, cls.object_key)
+                return
+            with open(cls.state_file, 'w') as state_file:
+                json.dump(watermarks, state_file, indent=2, sort_keys=True)
+
+# Tell s3transfer an object's size up front so it does not issue a HEAD request per download
+class TransferSize(BaseSubscriber):
+    def __init__(self, size: int):
+        self.size = size
+
+    def on_queued(self, future, **kwargs):
+        future.meta.provide_transfer_size(self.size)
+
+# Seekable file object writing ranged downloads straight into a preallocated buffer
+class BufferWriter(io.RawIOBase):
+    def __init__(self, size: int):
+        self.buffer = bytearray(size)
+        self.position = 0
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence=io.SEEK_SET) -> int:
+        self.position = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence] + offset
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def write(self, data) -> int:
+        end = self.position + len(data)
+        self.buffer[self.position:end] = data
+        self.position = end
+        self.size = max(self.size, end)
+        return len(data)
+
+    # The downloaded bytes, trimmed if the object turned out smaller than listed
+    def getbuffer(self) -> bytearray:
+        if self.size < len(self.buffer):
+            del self.buffer[self.size:]
+        return self.buffer
+
+# Read-only file object encoding pages of rows as newline-delimited JSON on demand
+class NDJSONStream(io.RawIOBase):
+    def __init__(self, pages):
+        self.pages = iter(pages)
+        self.buffer = bytearray()
+        self.rows = 0
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    # Encode just enough pages to fill the requested buffer
+    def readinto(self, buffer) -> int:
+        while len(self.buffer) < len(buffer):
+            page = next(self.pages, None)
+            if page is None:
+                break
+            self.rows += len(page)
+            self.buffer += ''.join(json.dumps(row) + '\n' for row in page).encode('utf-8')
+        size = min(len(buffer), len(self.buffer))
+        buffer[:size] = self.buffer[:size]
+        del self.buffer[:size]
+        self.size += size
+        return size
+
+# Rate limiter shared by worker threads, spacing requests to the same host evenly
+class RateLimiter:
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    # Block until the next request slot for the host is available
+    def wait(self, host: str) -> None:
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
 
 # EIA class for extracting data from api
 class EIA:
     # Define class variables
     api_key = os.environ.get('API_KEY')
     base_url = 'https://api.eia.gov/v2/'
+    page_length = 5000
+    max_workers = int(os.environ.get('EIA_MAX_WORKERS', 4))
+    requests_per_second = float(os.environ.get('EIA_REQUESTS_PER_SECOND', 5))
+    session = None
+    pool_size = 0
+    rate_limiter = None
+    lock = threading.Lock()
+
+    # Create the shared keep-alive session and rate limiter on first use and return them together
+    # The connection pool holds at least pool_size connections, growing when a larger worker pool asks for it;
+    # the adapter it replaces is closed so its keep-alive connections are released
+    @classmethod
+    def connection(cls, pool_size=None) -> tuple:
+        with cls.lock:
+            pool_size = max(pool_size or 0, cls.max_workers, 1)
+            if cls.session is None:
+                cls.session = requests.Session()
+                cls.pool_size = 0
+            if pool_size > cls.pool_size:
+                previous = {id(adapter): adapter for adapter in cls.session.adapters.values()}
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                cls.session.mount('http://', adapter)
+                cls.session.mount('https://', adapter)
+                for old_adapter in previous.values():
+                    old_adapter.close()
+                cls.pool_size = pool_size
+            if cls.rate_limiter is None:
+                cls.rate_limiter = RateLimiter(cls.requests_per_second)
+            return cls.session, cls.rate_limiter
+
+    # Return the shared session, creating it on first use (see connection)
+    @classmethod
+    def connect(cls, pool_size=None) -> requests.Session:
+        return cls.connection(pool_size)[0]
+
+    # Close the shared session
+    @classmethod
+    def disconnect(cls) -> None:
+        with cls.lock:
+            if cls.session is not None:
+                cls.session.close()
+            cls.session = None
+            cls.rate_limiter = None
 
-    # Define API request
+    # Define API request (parameters are copied so concurrent calls never share state); HTTP errors raise inside the
+    # eia_request timer so they are counted against it. The session and limiter are held locally so a concurrent
+    # disconnect cannot pull them out from under the request
     @classmethod
     def api_request(cls, endpoint: str, parameters: dict, offset=0) -> requests.Response:
+        session, rate_limiter = cls.connection()
         url = cls.base_url + endpoint
-        parameters['start'] = offset
-        response = requests.get(url, params=parameters)
+        parameters = dict(parameters, offset=offset)
+        parameters.setdefault('length', cls.page_length)
+        if cls.api_key is not None:
+            parameters.setdefault('api_key', cls.api_key)
+        rate_limiter.wait(urlparse(url).netloc)
+        with Metrics.timer('eia_request') as sample:
+            response = session.get(url, params=parameters)
+            sample['bytes'] = len(response.content)
+            response.raise_for_status()
         return response
-    
-    # Make API calls until all data has been extracted (API by defualt only returns 5000 rows)
+
+    # Request a single page and return its raw body
+    # Response bodies are cached under the url and normalized parameters, leaving out the api key, unless use_cache=False
     @classmethod
-    def extract_all(cls, endpoint: str, parameters: dict, offset=0):
-        data = []
-        while True:
-            response = cls.api_request(endpoint=endpoint, parameters=parameters, offset=offset)
-            if response.status_code == 200:
-                response_json = response.json()
+    def fetch_body(cls, endpoint: str, parameters: dict, offset=0, use_cache=True) -> bytes:
+        normalized = {name: value for name, value in dict(parameters, offset=offset).items() if name != 'api_key'}
+        normalized.setdefault('length', cls.page_length)
+        cache_key = Cache.key('eia', cls.base_url + endpoint, normalized)
+        body = Cache.get(cache_key) if use_cache else None
+        if body is None:
+            body = cls.api_request(endpoint=endpoint, parameters=parameters, offset=offset).content
+            if use_cache:
+                Cache.put(cache_key, body)
+        return body
 
+    # Request a single page and return its rows along with the total row count reported by the API
+    @classmethod
+    def fetch_page(cls, endpoint: str, parameters: dict, offset=0, use_cache=True) -> tuple:
+        body = cls.fetch_body(endpoint=endpoint, parameters=parameters, offset=offset, use_cache=use_cache)
+        with Metrics.timer('eia_decode') as sample:
+            response_json = loads(body)['response']
+            sample['bytes'] = len(body)
+            sample['rows'] = len(response_json['data'])
+        return response_json['data'], int(response_json['total'])
 
-    
+    # Make API calls until all data has been extracted (API by defualt only returns 5000 rows), yielding each page as it arrives
+    # With concurrent=True the remaining pages are fetched on a bounded thread pool once the total is known,
+    # keeping at most max_workers + 1 pages in flight and yielding them in offset order
+    @classmethod
+    def iter_pages(cls, endpoint: str, parameters: dict, offset=0, concurrent=False, max_workers=None, use_cache=True, fetch=None):
+        length = int(parameters.get('length', cls.page_length))
+        fetch = fetch or cls.fetch_page
+        page, total = fetch(endpoint=endpoint, parameters=parameters, offset=offset, use_cache=use_cache)
+        yield page
+        offsets = range(offset + length, total, length)
+        if not concurrent:
+            for page_offset in offsets:
+                yield fetch(endpoint=endpoint, parameters=parameters, offset=page_offset, use_cache=use_cache)[0]
+            return
+        max_workers = max_workers or cls.max_workers
+        cls.connect(pool_size=max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            for page_offset in offsets:
+                pending.append(executor.submit(fetch, endpoint=endpoint, parameters=parameters, offset=page_offset, use_cache=use_cache))
+                if len(pending) > max_workers:
+                    yield pending.popleft().result()[0]
+            while pending:
+                yield pending.popleft().result()[0]
 
-    
+    # Yield each page parsed from its raw body into typed NumPy columns (see parse_body); with concurrent=True
+    # pages are parsed on the worker threads, since Arrow's JSON reader releases the GIL
+    @classmethod
+    def iter_columns(cls, endpoint: str, parameters: dict, offset=0, concurrent=False, max_workers=None, data_columns=('value',), categories=None):
+        def fetch(endpoint: str, parameters: dict, offset=0, use_cache=True) -> tuple:
+            body = cls.fetch_body(endpoint=endpoint, parameters=parameters, offset=offset, use_cache=use_cache)
+            with Metrics.timer('eia_decode') as sample:
+                parsed, total = parse_body(body, data_columns, categories)
+                sample['bytes'] = len(body)
+                sample['rows'] = parsed['rows']
+            return parsed, total
+
+        yield from cls.iter_pages(endpoint=endpoint, parameters=parameters, offset=offset, concurrent=concurrent, max_workers=max_workers, fetch=fetch)
 
+    # Collect every page into one set of typed NumPy columns
+    @classmethod
+    def extract_columns(cls, endpoint: str, parameters: dict, offset=0, concurrent=False, max_workers=None, data_columns=('value',), categories=None) -> dict:
+        return concat_columns(list(cls.iter_columns(endpoint=endpoint, parameters=parameters, offset=offset, concurrent=concurrent, max_workers=max_workers, data_columns=data_columns, categories=categories)))
 
-    
+    # Collect every page into a single list of rows
+    @classmethod
+    def extract_all(cls, endpoint: str, parameters: dict, offset=0, concurrent=False, max_workers=None, use_cache=True) -> list:
+        data = []
+        with Metrics.timer('extract_all') as sample:
+            for page in cls.iter_pages(endpoint=endpoint, parameters=parameters, offset=offset, concurrent=concurrent, max_workers=max_workers, use_cache=use_cache):
+                data.extend(page)
+            sample['rows'] = len(data)
+        return data
 
+    # Extract only the periods newer than the stored watermark and merge them into the stored yearly partitions
+    # The start period is inclusive, so the latest stored period is fetched again and picks up any revisions
+    # The local cache is bypassed: the watermark stays put until new data lands, so a cached page would hide it
+    @classmethod
+    def extract_incremental(cls, endpoint: str, parameters: dict, folder: str, object_key: str, concurrent=False) -> list:
+        request_parameters = dict(parameters, **{'sort[0][column]': 'period', 'sort[0][direction]': 'asc'})
+        destination = folder + object_key
+        start = Watermarks.get(endpoint, parameters, destination)
+        # A watermark is only trusted while its dataset still has partitions; a cleared dataset is pulled in full
+        if start is not None and S3.connect().list_objects_v2(Bucket=S3.bucket, Prefix=destination + '/', MaxKeys=1).get('Contents'):
+            request_parameters['start'] = start
+        data = cls.extract_all(endpoint=endpoint, parameters=request_parameters, concurrent=concurrent, use_cache=False)
+        if data:
+            data_columns = [column for name, value in parameters.items() if name.startswith('data[')
+                            for column in (value if isinstance(value, (list, tuple)) else [value])] or ['value']
+            S3.merge_partitions(data, folder, object_key, data_columns=data_columns)
+            Watermarks.set(endpoint, parameters, destination, max(row['period'] for row in data))
+        return data
 
+# Batch extraction of many series from a manifest of {'name', 'endpoint', 'parameters'} entries
+# Series that differ only in facet values are merged into one request when the merged query returns exactly their rows
+# Pages of every planned request share one worker pool and EIA's rate limiter; a failed page is retried alone with exponential backoff
+class Batch:
+    # Define class variables
+    max_workers = int(os.environ.get('EIA_BATCH_WORKERS', 4))
+    max_retries = int(os.environ.get('EIA_BATCH_RETRIES', 3))
+    backoff = float(os.environ.get('EIA_BATCH_BACKOFF', 1.0))
+    max_merged_series = int(os.environ.get('EIA_BATCH_MAX_MERGED_SERIES', 20))
+    retryable_status_codes = (429, 500, 502, 503, 504)
 
+    # Split request parameters into the shared part and a {facet: [values]} mapping
+    @staticmethod
+    def split_facets(parameters: dict) -> tuple:
+        base, facets = {}, {}
+        for name, value in parameters.items():
+            if name.startswith('facets['):
+                facets[name[len('facets['):name.index(']')]] = sorted(value) if isinstance(value, (list, tuple)) else [value]
+            else:
+                base[name] = value
+        return base, facets
 
+    # Group manifest entries into requests, merging series whose facet combinations union without extra rows
+    @classmethod
+    def plan(cls, manifest: list) -> list:
+        groups = {}
+        for series in manifest:
+            base, facets = cls.split_facets(series['parameters'])
+            key = (series['endpoint'], json.dumps(base, sort_keys=True), tuple(sorted(facets)))
+            groups.setdefault(key, []).append((series, base, facets))
+        requests_plan = []
+        for (endpoint, _, names), group in groups.items():
+            requests_plan.extend(cls.merge(endpoint, names, group))
+        return requests_plan
 
+    # Whether the cross product of the members' facet values is exactly the union of their own combinations
+    @staticmethod
+    def exact(names: tuple, members: list) -> bool:
+        combinations = {combination for _, _, facets in members for combination in product(*(facets[name] for name in names))}
+        return len(combinations) == math.prod(len({value for _, _, facets in members for value in facets[name]}) for name in names)
+
+    # Merge one group of series greedily: each member joins the first request it extends without over-fetching,
+    # so a member that breaks the cross product only stays out itself rather than splitting up the whole group
+    @classmethod
+    def merge(cls, endpoint: str, names: tuple, members: list) -> list:
+        clusters = []
+        for member in members:
+            for cluster in clusters:
+                if len(cluster) < cls.max_merged_series and cls.exact(names, cluster + [member]):
+                    cluster.append(member)
+                    break
+            else:
+                clusters.append([member])
+        requests_plan = []
+        for cluster in clusters:
+            if len(cluster) == 1:
+                series = cluster[0][0]
+                requests_plan.append({'endpoint': endpoint, 'parameters': series['parameters'], 'series': [series]})
+                continue
+            union = {name: sorted({value for _, _, facets in cluster for value in facets[name]}) for name in names}
+            parameters = dict(cluster[0][1], **{'facets[%s][]' % name: values for name, values in union.items()})
+            requests_plan.append({'endpoint': endpoint, 'parameters': parameters, 'series': [series for series, _, _ in cluster]})
+        return requests_plan
+
+    @classmethod
+    def retryable(cls, error: Exception) -> bool:
+        if isinstance(error, requests.HTTPError):
+            return error.response is not None and error.response.status_code in cls.retryable_status_codes
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+    # Split a request's rows back out per series by their facet columns
+    @staticmethod
+    def split_rows(request: dict, rows: list) -> dict:
+        data = {series['name']: [] for series in request['series']}
+        facets = {series['name']: Batch.split_facets(series['parameters'])[1] for series in request['series']}
+        for row in rows:
+            for name, series_facets in facets.items():
+                if all(row.get(facet) in values for facet, values in series_facets.items()):
+                    data[name].append(row)
+        return data
+
+    # Run the manifest and return {'series': {name: result}, 'summary': {...}}; failed series do not stop the batch
+    # Individual pages are the unit of work on the single worker pool: the first page of each planned request
+    # gives its total, then the remaining offsets are queued. A failed page alone is retried with backoff
+    @classmethod
+    def run(cls, manifest: list, max_workers=None) -> dict:
+        start = time.perf_counter()
+        plan = cls.plan(manifest)
+        max_workers = max_workers or cls.max_workers
+        EIA.connect(pool_size=max_workers)
+        states = [{'pages': {}, 'remaining': None, 'attempts': 1, 'retries': 0, 'error': None} for _ in plan]
+        results = {}
+        retries = 0
 
+        # Record the outcome of a planned request once all of its pages are in, or once one of them has failed for good
+        def finish(index: int) -> None:
+            request, state = plan[index], states[index]
+            if state['error'] is not None:
+                for series in request['series']:
+                    results[series['name']] = {'status': 'failed', 'error': repr(state['error']), 'attempts': state['attempts'], 'retries': state['retries'], 'rows': 0, 'data': []}
+                return
+            elapsed = time.perf_counter() - state['start']
+            data = cls.split_rows(request, [row for offset in sorted(state['pages']) for row in state['pages'][offset]])
+            for series in request['series']:
+                rows = len(data[series['name']])
+                results[series['name']] = {'status': 'ok', 'attempts': state['attempts'], 'retries': state['retries'], 'requests': len(state['pages']), 'merged_with': len(request['series']) - 1,
+                                           'rows': rows, 'seconds': elapsed, 'rows_per_second': rows / elapsed if elapsed else 0.0, 'data': data[series['name']]}
 
+        # Fetch one page of a planned request; its clock starts when its first page starts running, not while it is queued
+        def fetch(index: int, offset: int) -> tuple:
+            states[index].setdefault('start', time.perf_counter())
+            request = plan[index]
+            return EIA.fetch_page(endpoint=request['endpoint'], parameters=request['parameters'], offset=offset)
 
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def submit(index: int, offset: int, attempt: int) -> None:
+                running[executor.submit(fetch, index, offset)] = (index, offset, attempt)
 
+            running = {}
+            waiting = []
+            for index in range(len(plan)):
+                submit(index, 0, 1)
+            while running or waiting:
+                now = time.monotonic()
+                while waiting and waiting[0][0] <= now:
+                    _, index, offset, attempt = heapq.heappop(waiting)
+                    # A retry of a request that has since failed for good would only spend rate budget on a discarded page
+                    if states[index]['error'] is None:
+                        submit(index, offset, attempt)
+                timeout = waiting[0][0] - now if waiting else None
+                if not running:
+                    if timeout is not None:
+                        time.sleep(timeout)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, offset, attempt = running.pop(future)
+                    state = states[index]
+                    if state['error'] is not None:
+                        continue
+                    try:
+                        page, total = future.result()
+                    except Exception as error:
+                        if cls.retryable(error) and attempt <= cls.max_retries:
+                            retries += 1
+                            state['retries'] += 1
+                            state['attempts'] = max(state['attempts'], attempt + 1)
+                            Metrics.increment('retries')
+                            heapq.heappush(waiting, (time.monotonic() + cls.backoff * 2 ** (attempt - 1), index, offset, attempt + 1))
+                        else:
+                            state['error'] = error
+                            finish(index)
+                        continue
+                    state['pages'][offset] = page
+                    if state['remaining'] is None:
+                        length = int(plan[index]['parameters'].get('length', EIA.page_length))
+                        offsets = range(length, total, length)
+                        state['remaining'] = len(offsets)
+                        for page_offset in offsets:
+                            submit(index, page_offset, 1)
+                    else:
+                        state['remaining'] -= 1
+                    if state['remaining'] == 0:
+                        finish(index)
+        elapsed = time.perf_counter() - start
+        total_rows = sum(result['rows'] for result in results.values())
+        summary = {'series': len(manifest), 'succeeded': sum(result['status'] == 'ok' for result in results.values()), 'failed': sum(result['status'] == 'failed' for result in results.values()),
+                   'planned_requests': len(plan), 'retries': retries, 'rows': total_rows, 'seconds': elapsed, 'rows_per_second': total_rows / elapsed if elapsed else 0.0}
+        return {'series': {series['name']: results[series['name']] for series in manifest}, 'summary': summary}
 
-    
+    # Format per-series throughput and the run summary as a text table
+    @staticmethod
+    def report(results: dict) -> str:
+        lines = ['%-24s %-7s %9s %9s %8s %11s' % ('series', 'status', 'rows', 'seconds', 'attempts', 'rows/s')]
+        for name, result in results['series'].items():
+            lines.append('%-24s %-7s %9d %9.3f %8d %11.0f' % (name, result['status'], result['rows'], result.get('seconds', 0.0), result['attempts'], result.get('rows_per_second', 0.0)))
+        summary = results['summary']
+        lines.append('%(succeeded)d/%(series)d series ok, %(failed)d failed, %(planned_requests)d planned requests, %(retries)d retries, %(rows)d rows in %(seconds).3fs (%(rows_per_second).0f rows/s)' % summary)
+        return '\n'.join(lines)